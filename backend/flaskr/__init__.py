@@ -1,16 +1,61 @@
 import os
-from flask import Flask, request, abort, jsonify, Response
+import hashlib
+from flask import Flask, request, abort, jsonify, Response, current_app
 from flask_sqlalchemy import SQLAlchemy
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-import random
+import orjson
+from sqlalchemy import delete, func, insert
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import raiseload
 
-from models import setup_db, Question, Category
+from models import setup_db, db, Question, Category
 
 QUESTIONS_PER_PAGE = 10
+# OFFSET is a bigint in Postgres, so deeper pages cannot be expressed
+MAX_PAGE = (2 ** 63 - 1) // QUESTIONS_PER_PAGE
+
+_CORS_HEADERS = (
+    ('Access-Control-Allow-Headers', 'Content-Type'),
+    ('Access-Control-Allow-Methods', 'POST, GET, PATCH, DELETE'),
+)
+
+"""
+Categories rarely change, so each app builds its id -> type dict once
+and reuses it until _invalidate_categories() is called
+"""
+def _category_cache():
+    return current_app.extensions['category_cache']
+
+def get_cat_dict():
+    cache = _category_cache()
+    if cache['dict'] is None:
+        cache['dict'] = dict(db.session.query(Category.id, Category.type).all())
+    return cache['dict']
+
+def _invalidate_categories():
+    cache = _category_cache()
+    cache['ver'] += 1
+    cache['dict'] = None
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    JSON provider backed by orjson, used by jsonify and request.get_json
+    """
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
+    app.json = OrjsonProvider(app)
+    app.extensions['category_cache'] = {'ver': 0, 'dict': None}
     setup_db(app)
 
     """
@@ -24,8 +69,7 @@ def create_app(test_config=None):
     """
     @app.after_request
     def after_request(response):
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type')
-        response.headers.add('Access-Control-Allow-Methods', 'POST, GET, PATCH, DELETE')
+        response.headers.extend(_CORS_HEADERS)
         return response
 
 
@@ -35,26 +79,61 @@ def create_app(test_config=None):
     """
     @app.route('/categories')
     def get_categories():
-        categories = Category.query.all()
-        
-        cat_dict = {}
-        for cat in categories:
-            cat_dict[cat.id] = cat.type
+        cat_dict = get_cat_dict()
+        etag = make_etag(_category_cache()['ver'], sorted(cat_dict.items()))
 
-        return jsonify({
+        response = jsonify({
             'success': True,
             'categories': cat_dict,
-            'total_categories': len(categories)
+            'total_categories': len(cat_dict)
         })
+        response.set_etag(etag)
+        return response.make_conditional(request)
 
+    def make_etag(*parts):
+        return hashlib.blake2b(orjson.dumps(parts), digest_size=16).hexdigest()
 
-    def paginate_questions(request, selection):
-        page = request.args.get('page', 1, type=int)
-        start = (page - 1) * QUESTIONS_PER_PAGE
-        end = start + QUESTIONS_PER_PAGE
-        questions = [question.format() for question in selection]
-        current_questions = questions[start:end]
-        return current_questions
+    def not_modified(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+
+    def paginate_questions(request, selection, page=None):
+        """
+        Paginate a Question query (ordered by Question.id) in the database,
+        only the rows for the requested page are fetched.
+        If after_id is given, seek past that id instead of using an offset,
+        which stays fast no matter how deep the page is.
+        An explicit page overrides both request arguments.
+        Returns the page and the cursor for the next one, which is None
+        once there are no more questions
+        """
+        # only the columns format() needs, returned as plain rows
+        selection = selection.with_entities(Question.id, Question.question, Question.answer, Question.category, Question.difficulty)
+        after_id = request.args.get('after_id', None, type=int)
+        if page is None and after_id is not None:
+            selection = selection.filter(Question.id > after_id)
+        else:
+            if page is None:
+                page = request.args.get('page', 1, type=int)
+            if page < 1 or page > MAX_PAGE:
+                abort(404)
+            start = (page - 1) * QUESTIONS_PER_PAGE
+            selection = selection.offset(start)
+        # one extra row tells whether another page follows
+        rows = selection.limit(QUESTIONS_PER_PAGE + 1).all()
+        has_more = len(rows) > QUESTIONS_PER_PAGE
+        rows = rows[:QUESTIONS_PER_PAGE]
+        current_questions = [{
+            'id': row.id,
+            'question': row.question,
+            'answer': row.answer,
+            'category': row.category,
+            'difficulty': row.difficulty
+            } for row in rows]
+        cursor = current_questions[-1]['id'] if has_more else None
+        return current_questions, cursor
 
     """
     Create an endpoint to handle GET requests for questions,
@@ -62,23 +141,36 @@ def create_app(test_config=None):
     """
     @app.route('/questions')
     def get_questions():
-        selection = Question.query.order_by(Question.id).all()
-        current_questions = paginate_questions(request, selection)
+        # a cheap count/max lets unchanged pages answer 304 before fetching any rows
+        total_questions, last_id = db.session.query(func.count(Question.id), func.max(Question.id)).one()
+        etag = make_etag(
+            total_questions,
+            last_id,
+            request.args.get('page', 1, type=int),
+            request.args.get('after_id', None, type=int),
+            _category_cache()['ver']
+        )
+
+        if etag in request.if_none_match:
+            return not_modified(etag)
 
-        categories = Category.query.all()
-        cat_dict = {}
-        for cat in categories:
-            cat_dict[cat.id] = cat.type
+        selection = Question.query.order_by(Question.id)
+        current_questions, cursor = paginate_questions(request, selection)
+
+        cat_dict = get_cat_dict()
 
         if len(current_questions) == 0:
             abort(404)
 
-        return jsonify({
+        response = jsonify({
             'success': True,
             'questions': current_questions,
-            'total_questions': len(Question.query.all()),
-            'categories': cat_dict
+            'total_questions': total_questions,
+            'categories': cat_dict,
+            'next_cursor': cursor
         })
+        response.set_etag(etag)
+        return response
 
 
     """
@@ -86,19 +178,24 @@ def create_app(test_config=None):
     """ 
     @app.route('/questions/<int:question_id>', methods=['DELETE'])
     def delete_question(question_id):
-        question = Question.query.filter(Question.id == question_id).one_or_none()
+        deleted = db.session.execute(
+            delete(Question).where(Question.id == question_id).returning(Question.id)
+        ).scalar()
 
-        if question is None:
+        if deleted is None:
+            db.session.rollback()
             abort(404)
 
-        question.delete()
-        selection = Question.query.order_by(Question.id).all()
-        current_questions = paginate_questions(request, selection)
+        selection = Question.query.order_by(Question.id)
+        current_questions, _ = paginate_questions(request, selection)
+        total_questions = Question.query.count()
+        db.session.commit()
+
         return jsonify({
             'success': True,
-            'deleted': question.id,
+            'deleted': deleted,
             'questions': current_questions,
-            'total_questions': len(Question.query.all())
+            'total_questions': total_questions
         })
 
     """
@@ -108,27 +205,44 @@ def create_app(test_config=None):
     """
     @app.route('/questions', methods=['POST'])
     def create_question():
-        body = request.get_json()
+        body = request.get_json(silent=True, cache=True) or {}
+
+        if not isinstance(body, dict):
+            abort(400)
+
         new_question = body.get('question', None)
         new_answer= body.get('answer', None)
-        new_category = body.get('category', None)
-        new_difficulty = body.get('difficulty', None)
+
+        if not isinstance(new_question, str) or not isinstance(new_answer, str):
+            abort(400)
 
         try:
-            question = Question(question=new_question, answer=new_answer, category=new_category, difficulty=new_difficulty)
-            question.insert()
+            new_category = int(body.get('category', None))
+            new_difficulty = int(body.get('difficulty', None))
+        except (ValueError, TypeError):
+            abort(400)
 
-            selection = Question.query.order_by(Question.id).all()
-            current_questions = paginate_questions(request, selection)
+        try:
+            added = db.session.execute(
+                insert(Question).values(question=new_question, answer=new_answer, category=new_category, difficulty=new_difficulty).returning(Question.id)
+            ).scalar()
+
+            # the new question has the highest id, so it is on the last page
+            total_questions = Question.query.count()
+            last_page = (total_questions - 1) // QUESTIONS_PER_PAGE + 1
+            selection = Question.query.order_by(Question.id)
+            current_questions, _ = paginate_questions(request, selection, page=last_page)
+            db.session.commit()
 
             return jsonify({
                 'success': True,
-                'added': question.id,
+                'added': added,
                 'questions': current_questions,
-                'total_questions': len(Question.query.all())
+                'total_questions': total_questions
             })
-        
-        except:
+
+        except (DataError, IntegrityError):
+            db.session.rollback()
             abort(400)
 
     """
@@ -138,18 +252,24 @@ def create_app(test_config=None):
     """
     @app.route('/questions/search', methods=['POST'])
     def search_questions():
-        body = request.get_json()
+        body = request.get_json(silent=True, cache=True) or {}
+
+        if not isinstance(body, dict):
+            abort(422)
+
         search = body.get('searchTerm', None)
 
         if search is None:
             abort(422)
 
-        selection = Question.query.order_by(Question.id).filter(Question.question.ilike('%{}%'.format(search))).all()
-        current_questions = paginate_questions(request, selection)
+        selection = Question.query.filter(Question.question.ilike('%{}%'.format(search)))
+        total_searched_questions = selection.with_entities(func.count(Question.id)).scalar()
+        current_questions, cursor = paginate_questions(request, selection.order_by(Question.id))
         return jsonify({
             'success': True,
             'questions': current_questions,
-            'total_searched_questions': len(selection)
+            'total_searched_questions': total_searched_questions,
+            'next_cursor': cursor
         })
         
         
@@ -158,8 +278,8 @@ def create_app(test_config=None):
     """
     @app.route('/categories/<int:category_id>/questions')
     def get_questions_by_category(category_id):
-        selection = Question.query.order_by(Question.id).filter(Question.category == category_id).all()
-        current_questions = paginate_questions(request, selection)
+        selection = Question.query.order_by(Question.id).filter(Question.category == category_id)
+        current_questions, cursor = paginate_questions(request, selection)
         category = Category.query.filter(Category.id == category_id).one_or_none()
 
         if category is None:
@@ -169,7 +289,8 @@ def create_app(test_config=None):
             'success': True,
             'questions': current_questions,
             'total_questions': len(current_questions),
-            'current_category': category.type
+            'current_category': category.type,
+            'next_cursor': cursor
         })
 
     """
@@ -180,45 +301,38 @@ def create_app(test_config=None):
     """
     @app.route('/quizzes', methods=['POST'])
     def play():
+        body = request.get_json(silent=True, cache=True) or {}
+
+        if not isinstance(body, dict):
+            abort(422)
+
         try:
-            body = request.get_json()
-            category = body.get('quiz_category', None)
-            prev_questions = body.get('previous_questions', None)
-            category_id = category['id']
-            selection = []
-
-            if category_id == 0:
-                selection = Question.query.all()
-            else:
-                selection = Question.query.filter(Question.category == category_id).all()
-
-            def get_next_random_question():
-                question = random.choice(selection).format()
-                return question
-            
-            current_question = get_next_random_question()
-            answered_question = False       
-
-            if current_question['id'] in prev_questions:
-                answered_question = True
-            
-            while answered_question:
-                current_question = get_next_random_question()
-
-                if (len(prev_questions) == len(selection)):
-                    return jsonify({
-                        'success': True,
-                        'message': 'no new questions'
-                    })
+            category = body.get('quiz_category') or {}
+            prev_questions = {int(i) for i in body.get('previous_questions') or ()}
+            category_id = int(category['id'])
+        except (AttributeError, KeyError, TypeError, ValueError):
+            abort(422)
+
+        selection = Question.query.options(raiseload('*'))
+
+        if category_id != 0:
+            selection = selection.filter(Question.category == category_id)
+
+        if prev_questions:
+            selection = selection.filter(~Question.id.in_(prev_questions))
+
+        question = selection.order_by(func.random()).limit(1).first()
 
+        if question is None:
             return jsonify({
                 'success': True,
-                'question': current_question
+                'message': 'no new questions'
             })
 
-        except Exception as e:
-            print(e)
-            abort(422)
+        return jsonify({
+            'success': True,
+            'question': question.format()
+        })
 
     """
     Create error handlers for all expected errors
@@ -1,5 +1,5 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+from sqlalchemy import Column, String, Integer, Index, create_engine
 from flask_sqlalchemy import SQLAlchemy
 import json
 
@@ -17,6 +17,12 @@ setup_db(app)
 def setup_db(app, database_path=database_path):
     app.config["SQLALCHEMY_DATABASE_URI"] = database_path
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        'pool_size': 20,
+        'max_overflow': 10,
+        'pool_pre_ping': True,
+        'pool_recycle': 1800
+    }
     db.app = app
     db.init_app(app)
     db.create_all()
@@ -26,6 +32,12 @@ Question
 """
 class Question(db.Model):
     __tablename__ = 'questions'
+    # the pg_trgm index behind the ILIKE search is created in trivia.psql,
+    # since it needs the extension installed first
+    __table_args__ = (
+        # category pages filter on category and order/seek by id
+        Index('ix_question_category_id', 'category', 'id'),
+    )
 
     id = Column(Integer, primary_key=True)
     question = Column(String)
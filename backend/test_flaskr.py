@@ -60,6 +60,52 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], False)
         self.assertEqual(data['message'], 'resource not found')
 
+    def test_404_sent_requesting_page_zero(self):
+        res = self.client().get('/questions?page=0')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'resource not found')
+
+    def test_get_questions_with_cursor(self):
+        res = self.client().get('/questions')
+        data = json.loads(res.data)
+        ids = [q['id'] for q in data['questions']]
+
+        while data['next_cursor'] is not None:
+            res = self.client().get('/questions?after_id={}'.format(data['next_cursor']))
+            data = json.loads(res.data)
+
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(data['success'], True)
+            self.assertTrue(all(q['id'] > ids[-1] for q in data['questions']))
+            ids += [q['id'] for q in data['questions']]
+
+        self.assertEqual(len(ids), data['total_questions'])
+
+    def test_304_if_questions_not_modified(self):
+        first = self.client().get('/questions')
+        res = self.client().get('/questions', headers={'If-None-Match': first.headers['ETag']})
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.headers['ETag'], first.headers['ETag'])
+
+    def test_questions_etag_changes_after_create(self):
+        first = self.client().get('/questions')
+        self.client().post('/questions', json=self.new_question)
+        res = self.client().get('/questions', headers={'If-None-Match': first.headers['ETag']})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers['ETag'], first.headers['ETag'])
+
+    def test_304_if_categories_not_modified(self):
+        first = self.client().get('/categories')
+        res = self.client().get('/categories', headers={'If-None-Match': first.headers['ETag']})
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.headers['ETag'], first.headers['ETag'])
+
     def test_get_all_categories(self):
         res = self.client().get('/categories')
         data = json.loads(res.data)
@@ -91,6 +137,19 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['added'])
         self.assertTrue(len(data['questions']))
 
+    def test_400_if_question_creation_malformed(self):
+        res = self.client().post('/questions', json={
+            'question': {'a': 1},
+            'answer': 'Four (4)',
+            'category': '3',
+            'difficulty': '3'
+        })
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'bad request')
+
     def test_405_if_question_creation_not_allowed(self):
         res = self.client().post('/questions/63', json=self.new_question)
         data = json.loads(res.data)
@@ -117,6 +176,14 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(len(data['questions']), 0)
         self.assertEqual(data['total_searched_questions'], 0)
 
+    def test_422_if_search_body_is_not_an_object(self):
+        res = self.client().post('/questions/search', json=[1])
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'unprocessable')
+
     def test_find_questions_by_given_category_id(self):
         res = self.client().get('/categories/2/questions')
         data = json.loads(res.data)
@@ -145,6 +212,35 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], True)
         self.assertTrue(data['question'])
 
+    def test_play_quiz_without_new_questions(self):
+        res = self.client().post('/quizzes', json={
+            'previous_questions': [16, 17, 18, 19],
+            'quiz_category': {'id': '2', 'type': 'Art'}
+        })
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['success'], True)
+        self.assertEqual(data['message'], 'no new questions')
+
+    def test_422_play_quiz_with_invalid_previous_questions(self):
+        res = self.client().post('/quizzes', json={
+            'previous_questions': ['x'],
+            'quiz_category': {'id': '4', 'type': 'History'}
+        })
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(data['success'], False)
+
+    def test_422_play_quiz_without_category(self):
+        res = self.client().post('/quizzes', json={'previous_questions': []})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(data['success'], False)
+        self.assertEqual(data['message'], 'unprocessable')
+
 
 # Make the tests conveniently executable
 if __name__ == "__main__":